@@ -20,6 +20,8 @@ struct portal_data_t {
 	double startup_cost;
 	double total_cost;
 	double plan_rows;
+	u16 query_len;
+	u16 search_path_len;
 	char query[MAX_QUERY_LENGTH]; // Dynamically injected using defines
 	char instrument[STRUCT_SIZE_Instrumentation]; // Dynamically injected using defines
 	char search_path[MAX_SEARCHPATH_LENGTH];
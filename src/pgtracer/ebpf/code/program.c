@@ -24,6 +24,7 @@ int executorrun_enter(struct pt_regs *ctx)
 	void *portaladdr;
 	void *search_path;
 	void *plan;
+	int ret;
 
 	struct portal_data_t *event;
 	bpf_probe_read_user(&portaladdr,
@@ -37,8 +38,9 @@ int executorrun_enter(struct pt_regs *ctx)
 	event->portal_key = key;
 	fill_portal_data(queryDesc, event);
 	bpf_probe_read_user(&search_path, sizeof(void *), (void *) GlobalVariablesnamespace_search_path);
-	bpf_probe_read_user_str(&event->search_path, MAX_SEARCHPATH_LENGTH,
+	ret = bpf_probe_read_user_str(&event->search_path, MAX_SEARCHPATH_LENGTH,
 							search_path);
+	event->search_path_len = ret > 0 ? ret - 1 : 0;
 	event_ring.ringbuf_submit(event, 0);
 	return 0;
 }
@@ -62,9 +62,12 @@ static inline void fill_portal_data(void * queryDesc, struct portal_data_t* even
 	bpf_probe_read_user(&sourceText,
 						sizeof(void *),
 						OffsetFrom(queryDesc, QueryDesc, sourceText));
-	bpf_probe_read_user_str(&event->query,
+	ret = bpf_probe_read_user_str(&event->query,
 							MAX_QUERY_LENGTH,
 							(void *) sourceText);
+	/* The returned length includes the terminating NUL byte. */
+	event->query_len = ret > 0 ? ret - 1 : 0;
+	event->search_path_len = 0;
 	ret = bpf_probe_read_user(&plannedStmt,
 							  sizeof(void *),
 							  OffsetFrom(queryDesc, QueryDesc, plannedstmt));
@@ -108,8 +111,10 @@ static inline void fill_portal_data(void * queryDesc, struct portal_data_t* even
 static inline void init_portal_data(struct portal_data_t* event)
 {
 	event->query[0] = 0;
+	event->query_len = 0;
 	event->instrument[0] = 0;
 	event->search_path[0] = 0;
+	event->search_path_len = 0;
 }
 
 /*
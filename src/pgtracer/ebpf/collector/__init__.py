@@ -20,16 +20,22 @@ from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Un
 from bcc import BPF, USDT, PerfSWConfig, PerfType
 from bcc import __version__ as bcc_version
 from bcc import lib as bcclib
-from pypsutil import Process
 
 from ...model import MemoryAllocType, Query
+from ...utils import get_parent_pid, get_process_name
 from ..dwarf import DWARFPointer, ProcessMetadata, Struct, get_size
 from ..unwind import stack_data_t
 from .c_defs import *
+from .ringbuffer import RingBufferConsumer
 from .utils import CODE_BASE_PATH, defines_dict_to_c, intenum_to_c, load_c_file
 
 BCC_VERSION_TUPLE = tuple(int(part) for part in bcc_version.split("."))
 
+# Offsets of the event_base members, to read them without wrapping every
+# event in a Structure instance.
+_OFF_EVENT_TYPE = event_base.event_type.offset
+_OFF_EVENT_PID = event_base.pid.offset
+
 
 class InvalidStateException(Exception):
     """
@@ -51,28 +57,38 @@ class EventHandler:
     """
 
     def __init__(self) -> None:
-        pass
-
-    def handle_event(self, bpf_collector: BPFCollector, event: ct._CData) -> int:
+        # Precompute the dispatch table once: resolving the handler through
+        # EventType(...).name + getattr on every event is measurable overhead
+        # on the hot path.
+        self._dispatch: Dict[int, Callable[[BPFCollector, int, int], int]] = {}
+        for event_type in EventType:
+            method = getattr(self, f"handle_{event_type.name}", None)
+            if method is not None:
+                # Key by the plain int value: the event type read from the
+                # ring buffer is a raw c_short and hashing ints is cheaper
+                # than going through the IntEnum machinery.
+                self._dispatch[int(event_type)] = method
+
+    def handle_event(self, bpf_collector: BPFCollector, event_addr: int) -> int:
         """
         Handle an event from EBPF ringbuffer.
         Every event should be tagged with a short int as the first member to
         handle it's type. It is then dispatched to the appropriate method,
         which will be able to make sense of the actual struct.
+
+        Handlers are given the event's address in the mmap'd ring buffer
+        page: building a ctypes view with from_address is cheaper than
+        copying the event out, but such views are only valid for the
+        duration of the callback.
         """
         # All events should be tagged with the event's type
-        event_stub = ct.cast(event, ct.POINTER(event_base)).contents
-        event_type_name = EventType(event_stub.event_type).name
-        pid = event_stub.pid
-        method_name = f"handle_{event_type_name}"
-        method: Callable[[BPFCollector, ct._CData, int], int] = getattr(
-            self, method_name
-        )
-        return method(bpf_collector, event, pid)
+        event_type = ct.c_short.from_address(event_addr + _OFF_EVENT_TYPE).value
+        pid = ct.c_int.from_address(event_addr + _OFF_EVENT_PID).value
+        return self._dispatch[event_type](bpf_collector, event_addr, pid)
 
     # pylint: disable=unused-argument
     def handle_ProcessExit(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ProcessExit event.
@@ -81,7 +97,7 @@ class EventHandler:
 
     # pylint: disable=unused-argument
     def handle_ProcessFork(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ProcessEnter event.
@@ -180,6 +196,11 @@ class BPFCollector:
             self.ppid = None
 
         self.metadata = metadata
+        # Bind the dynamic struct namespace and the Instrumentation class
+        # once: handlers would otherwise resolve them through several
+        # __getattr__ calls per event.
+        self.structs = metadata.structs
+        self.instrument_cls = self.structs.Instrumentation
         self.program = str(self.metadata.program).encode("utf8")
         # Old bcc version don't support global usdt probes, so disable
         # memory tracking in that case
@@ -191,8 +212,13 @@ class BPFCollector:
         self.bpf = self.prepare_bpf()
         self.setup_bpf_state()
         self.event_handler: EventHandler = self.event_handler_cls()
+        # Per-collector struct specializations, built by update_struct_defs.
+        self.portal_data: Type[portal_data]
+        self.planstate_data: Type[planstate_data]
+        self.stack_sample: Type[stack_sample]
         self.update_struct_defs()
         self.is_running = False
+        self.ring_consumer: Optional[RingBufferConsumer] = None
         self.background_thread: Optional[Thread] = None
         self.lock = Lock()
         self.sample_freq = options.sample_freq
@@ -207,35 +233,40 @@ class BPFCollector:
         """
         # FIXME: make this configurable
         cache_dir = Path("~/.cache").expanduser() / "pgtracer"
-        process = Process(pid=pid)
         # Check if we are given the postmaster pid, or a backend.
         # If our parent is itself a postgres process, then we are instrumenting the whole backend.
-        pprocess = process.parent()
+        ppid = get_parent_pid(pid)
         include_children = bool(
-            pprocess and pprocess.name() not in ("postgres", "postmaster")
+            ppid and get_process_name(ppid) not in ("postgres", "postmaster")
         )
-        processmetadata = ProcessMetadata(process, cache_dir=cache_dir)
+        processmetadata = ProcessMetadata(pid, cache_dir=cache_dir)
         return cls(processmetadata, options, include_children=include_children)
 
     def update_struct_defs(self) -> None:
         """
-        Update the ctypes struct definitions from the DWARF metadata.
+        Build the ctypes struct definitions from the DWARF metadata.
 
         Some C structs used in EBPF must match what is defined by Postgres:
-        so we build the class dynamically after the DWARF file has been loaded.
+        so we specialize the stub classes after the DWARF file has been
+        loaded, and keep them as instance attributes rather than mutating
+        the module-level classes.
         """
-        global instrument_type  # pylint: disable=global-statement
         instrument_type = ct.c_byte * self.metadata.structs.Instrumentation.size
-        # Update global struct definitions with actual sizes
-        portal_data.update_fields(
+        self.portal_data = portal_data.specialized(
             {
                 "query": ct.c_char * MAX_QUERY_LENGTH,
                 "instrument": instrument_type,
                 "search_path": ct.c_char * MAX_SEARCHPATH_LENGTH,
             }
         )
-        planstate_data.update_fields({"instrument": instrument_type})
-        stack_sample.update_fields({"portal_data": portal_data})
+        self.planstate_data = planstate_data.specialized(
+            {"instrument": instrument_type}
+        )
+        self.stack_sample = stack_sample.specialized({"portal_data": self.portal_data})
+        # Once the fields are known, remember the offsets of the hot
+        # portal_key members so that handlers can read them directly.
+        self.portal_key_offset: int = self.portal_data.portal_key.offset
+        self.planstate_key_offset: int = self.planstate_data.portal_key.offset
 
     @property
     def constant_defines(self) -> Dict[str, int]:
@@ -368,8 +399,9 @@ class BPFCollector:
         """
         Run the polling in the background.
         """
+        assert self.ring_consumer is not None
         while self.is_running:
-            self.bpf.ring_buffer_poll(refresh_rate)
+            self.ring_consumer.poll(refresh_rate)
             sleep(refresh_rate / 1000.0)
 
     def attach_probes(self) -> None:
@@ -398,7 +430,9 @@ class BPFCollector:
         if self.is_running:
             raise InvalidStateException("BPF Collector is already running")
         print("Starting eBPF collector...")
-        self.bpf[b"event_ring"].open_ring_buffer(self._handle_event)
+        self.ring_consumer = RingBufferConsumer(
+            self.bpf[b"event_ring"], self._handle_event
+        )
         self.attach_probes()
         self.is_running = True
         self.background_thread = Thread(target=self.background_polling, args=(100,))
@@ -413,6 +447,9 @@ class BPFCollector:
         if self.background_thread:
             self.background_thread.join()
             self.background_thread = None
+            if self.ring_consumer is not None:
+                self.ring_consumer.close()
+                self.ring_consumer = None
             for (
                 pid,
                 fd,
@@ -426,15 +463,16 @@ class BPFCollector:
             self.bpf.cleanup()
 
     # pylint: disable=unused-argument
-    def _handle_event(self, cpu: int, data: ct._CData, size: int) -> int:
+    def _handle_event(self, event_addr: int, size: int) -> int:
         """
-        Callback for the ring_buffer_poll. We actually dispatch this to the
-        `EventHandler`
+        Callback for the RingBufferConsumer. We actually dispatch this to the
+        `EventHandler`, passing the raw event address so that handlers can
+        build zero-copy views onto the ring buffer memory.
         """
         # Returning a negative value aborts polling
         if not self.is_running:
             return -1
-        return self.event_handler.handle_event(self, data)
+        return self.event_handler.handle_event(self, event_addr)
 
     def _optional_code(self) -> str:
         """
@@ -534,14 +572,17 @@ class BPFCollector:
         Generate the eBPF program, both from static code and dynamically
         generated defines and enums.
         """
-        buf = defines_dict_to_c(self.constant_defines)
-        buf += defines_dict_to_c(self.struct_offsets_defines)
-        buf += defines_dict_to_c(self.make_struct_sizes_dict())
-        buf += intenum_to_c(EventType)
-        buf += intenum_to_c(MemoryAllocType)
-        buf += intenum_to_c(self.make_global_variables_enum())
-        buf += load_c_file("program.c")
-        buf += self._optional_code()
+        parts = [
+            defines_dict_to_c(self.constant_defines),
+            defines_dict_to_c(self.struct_offsets_defines),
+            defines_dict_to_c(self.make_struct_sizes_dict()),
+            intenum_to_c(EventType),
+            intenum_to_c(MemoryAllocType),
+            intenum_to_c(self.make_global_variables_enum()),
+            load_c_file("program.c"),
+            self._optional_code(),
+        ]
+        buf = "".join(parts)
         # Ok, now workaround some limitations of the macro system with bcc and implement our own.
         buf = self.preprocess_code(buf)
         # Add the code directory as include dir
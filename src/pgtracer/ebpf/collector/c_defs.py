@@ -5,7 +5,7 @@ from __future__ import annotations
 
 import ctypes as ct
 from enum import IntEnum
-from typing import Dict, List, Tuple, Type
+from typing import Dict, List, Tuple, Type, TypeVar
 
 from ..unwind import stack_data_t
 
@@ -46,6 +46,17 @@ class Id128(ct.Structure):
         """
         return (self.u1, self.u2)
 
+    @staticmethod
+    def tuple_from_address(addr: int) -> Tuple[int, int]:
+        """
+        Read an Id128 living at addr as a two-int tuple, without wrapping
+        it in a Structure instance.
+        """
+        return (
+            ct.c_ulonglong.from_address(addr).value,
+            ct.c_ulonglong.from_address(addr + 8).value,
+        )
+
 
 # pylint: disable=invalid-name
 class EventType(IntEnum):
@@ -73,29 +84,28 @@ class EventType(IntEnum):
 instrument_type = ct.c_byte * 0
 
 
+_T = TypeVar("_T", bound="StubStructure")
+
+
 class StubStructure(ct.Structure):
     """
-    StubStructure definition, which actual fields must be updated at runtime.
+    StubStructure definition, which actual fields are only known at runtime.
     """
 
     _protofields: List[Tuple[str, Type[ct._CData]]] = []
 
     @classmethod
-    def update_fields(cls, fields: Dict[str, Type[ct._CData]]) -> None:
+    def specialized(cls: Type[_T], fields: Dict[str, Type[ct._CData]]) -> Type[_T]:
         """
-        Update the structure fields.
+        Returns a subclass of this stub with the given fields resolved.
+
+        The shared stub class itself is left untouched: each collector
+        builds its own specialization, so several collectors with
+        different Postgres binaries can coexist in one process.
         """
-        if hasattr(cls, "_fields_"):
-            # We are not allowed to update it. But if all updated values are
-            # the same as the first update, we don't care.
-            fields_dict = dict(cls._fields_)  # type: ignore
-            for key, value in fields.items():
-                if fields_dict[key] != value:
-                    raise ValueError("Cannot update a struct more than once.")
-            return
         fields_dict = dict(cls._protofields)
         fields_dict.update(fields)
-        cls._fields_ = list(fields_dict.items())
+        return type(cls.__name__, (cls,), {"_fields_": list(fields_dict.items())})
 
 
 MAX_QUERY_LENGTH = 2048
@@ -123,6 +133,8 @@ class portal_data(StubStructure):
         ("startup_cost", ct.c_double),
         ("total_cost", ct.c_double),
         ("plan_rows", ct.c_double),
+        ("query_len", ct.c_ushort),
+        ("search_path_len", ct.c_ushort),
         ("query", ct.c_char * MAX_QUERY_LENGTH),
         ("instrument", instrument_type),
         ("search_path", ct.c_char * MAX_SEARCHPATH_LENGTH),
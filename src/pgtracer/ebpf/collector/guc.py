@@ -65,12 +65,12 @@ class GUCTracerEventHandler(EventHandler):
 
     # pylint: disable=invalid-name
     def handle_GUCResponse(
-        self, bpf_collector: GUCTracerBPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: GUCTracerBPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle GUCResponse messages.
         """
-        event = ct.cast(event, ct.POINTER(guc_response)).contents
+        event = guc_response.from_address(event_addr)
         guc_def, value = bpf_collector.pending_guc_sets.pop(event.guc_location)
         if event.status:
             print(
@@ -4,26 +4,26 @@ BPF Collector tracing queries.
 from __future__ import annotations
 
 import ctypes as ct
+from array import array
+from collections import deque
 from dataclasses import dataclass, field
 from enum import IntEnum
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, List, Optional, Tuple
 
 from bcc import USDT
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from pgtracer.ebpf.dwarf import ProcessMetadata
 from pgtracer.model.plan import PlanState
 from pgtracer.model.query import Query
 
 from ...model import PlanState, Query, memory_account
 from . import BPFCollector, CollectorOptions, EventHandler, EventType
-from .c_defs import (
-    Id128,
-    io_req_data,
-    memory_response,
-    planstate_data,
-    portal_data,
-    stack_sample,
-)
+from .c_defs import Id128, io_req_data, memory_response, portal_data
 from .utils import load_c_file
 
 
@@ -53,18 +53,81 @@ class QueryTracerOptions(CollectorOptions):
     enable_query_discovery: bool = True
 
 
+# Maximum number of historical queries kept per backend: long running
+# collectors would otherwise grow without bound.
+MAX_QUERY_HISTORY = 10000
+
+
 @dataclass
 class PerProcessInfo:
     """
     Store information about the queries processed by a backend.
+
+    Besides the Query objects themselves, the runtime of finished queries
+    is mirrored in a compact array: aggregates can then iterate over it
+    instead of dereferencing every Query.
     """
 
     pid: int
     last_portal_key: Optional[Tuple[int, int]] = None
-    query_history: List[Query] = field(default_factory=list)
+    query_history: Deque[Query] = field(
+        default_factory=lambda: deque(maxlen=MAX_QUERY_HISTORY)
+    )
     query_cache: Dict[Tuple[int, int], Query] = field(default_factory=dict)
     current_executor: Optional[Tuple[int, int]] = None
     current_query: Optional[Query] = None
+    runtime_history: array[int] = field(default_factory=lambda: array("Q"))
+
+    def record_query_scalars(self, query: Query) -> None:
+        """
+        Append the given query's runtime (in nanoseconds) to the array.
+
+        Queries without a measured runtime (no timing instrumentation) are
+        skipped: recording them as zero would skew the aggregates.
+        """
+        runtime = query.runtime
+        if runtime is None:
+            return
+        self.runtime_history.append(int(runtime.total_seconds() * 1_000_000_000))
+        # Keep the array bounded too, trimming in bulk so that the
+        # amortized cost stays constant.
+        if len(self.runtime_history) > 2 * MAX_QUERY_HISTORY:
+            del self.runtime_history[:-MAX_QUERY_HISTORY]
+
+    def history_stats(self) -> Dict[str, float]:
+        """
+        Returns aggregate statistics about the measured runtimes (in
+        nanoseconds) of the recorded query history.
+
+        The aggregates are computed from the parallel scalar arrays rather
+        than the Query objects themselves; with numpy installed this is a
+        single vectorized reduction.
+        """
+        runtimes = self.runtime_history[-MAX_QUERY_HISTORY:]
+        count = len(runtimes)
+        if count == 0:
+            return {
+                "count": 0,
+                "total_runtime_ns": 0.0,
+                "mean_runtime_ns": 0.0,
+                "p99_runtime_ns": 0.0,
+            }
+        if np is not None:
+            arr = np.frombuffer(runtimes, dtype=np.uint64)
+            return {
+                "count": count,
+                "total_runtime_ns": float(arr.sum()),
+                "mean_runtime_ns": float(arr.mean()),
+                "p99_runtime_ns": float(np.percentile(arr, 99)),
+            }
+        ordered = sorted(runtimes)
+        total = float(sum(ordered))
+        return {
+            "count": count,
+            "total_runtime_ns": total,
+            "mean_runtime_ns": total / count,
+            "p99_runtime_ns": float(ordered[(99 * count) // 100]),
+        }
 
 
 # pylint: disable=invalid-name
@@ -74,6 +137,7 @@ class QueryTracerEventHandler(EventHandler):
     """
 
     def __init__(self) -> None:
+        super().__init__()
         self.per_process_info: Dict[int, PerProcessInfo] = {}
         self.next_request_id = 0
         self.process_history: List[PerProcessInfo] = []
@@ -93,32 +157,33 @@ class QueryTracerEventHandler(EventHandler):
         Process the portal data. This is used both when a query starts, and when we see
         the first live query during query discovery.
         """
-        key = event.portal_key.as_tuple()
+        key = Id128.tuple_from_address(
+            ct.addressof(event) + bpf_collector.portal_key_offset
+        )
         process_info = self.get_process_info(pid)
-        process_info.current_executor = event.portal_key.as_tuple()
+        process_info.current_executor = key
 
-        if key not in process_info.query_cache:
-            process_info.query_cache[key] = Query.from_event(
-                bpf_collector.metadata, event
-            )
+        query = process_info.query_cache.get(key)
+        if query is None:
+            query = Query.from_event(bpf_collector.metadata, event)
+            process_info.query_cache[key] = query
         else:
-            process_info.query_cache[key].update(bpf_collector.metadata, event)
-        process_info.current_query = process_info.query_cache[key]
+            query.update(bpf_collector.metadata, event)
+        process_info.current_query = query
         # If perf events are enabled, start watching the query instrumentation.
         if bpf_collector.options.enable_perf_events:
-            structs = bpf_collector.metadata.structs
             request = bpf_collector.build_memory_request(
                 EventType.MemoryResponseQueryInstr,
                 event.portal_key,
                 event.query_addr,
-                structs.QueryDesc,
+                bpf_collector.structs.QueryDesc,
                 ["planstate", "instrument"],
             )
             bpf_collector.send_memory_request(pid, request)
         return 0
 
     def handle_ExecutorRun(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ExecutorRun event. This event is produced by an uprobe on
@@ -130,31 +195,30 @@ class QueryTracerEventHandler(EventHandler):
         if bpf_collector.options.enable_perf_events:
             bpf_collector.bpf[b"discovery_enabled"][ct.c_int(1)] = ct.c_bool(False)
             bpf_collector.bpf[b"discovery_enabled"][ct.c_int(2)] = ct.c_bool(False)
-        event = ct.cast(event, ct.POINTER(portal_data)).contents
+        event = bpf_collector.portal_data.from_address(event_addr)
         return self._process_portal_data(bpf_collector, event, pid)
 
     # pylint: disable=unused-argument
     def handle_ExecutorFinish(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ExecutorFinish event.
         """
-        event = ct.cast(event, ct.POINTER(portal_data)).contents
-        key = event.portal_key.as_tuple()
+        event = bpf_collector.portal_data.from_address(event_addr)
+        key = Id128.tuple_from_address(event_addr + bpf_collector.portal_key_offset)
         process_info = self.get_process_info(pid)
         if process_info.current_executor:
             process_info.current_executor = None
             process_info.current_query = None
-        if key in process_info.query_cache:
-            process_info.query_cache[event.portal_key.as_tuple()].update(
-                bpf_collector.metadata, event
-            )
+        query = process_info.query_cache.get(key)
+        if query is not None:
+            query.update(bpf_collector.metadata, event)
         return 0
 
     # pylint: disable=unused-argument
     def handle_DropPortalEnter(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle DropPortalEnter event. This event is produced by a uprobe on
@@ -169,18 +233,19 @@ class QueryTracerEventHandler(EventHandler):
         it's identifier. Only once we return from DropPortal will we actually
         clean up the query from our current cache, and append it to history.
         """
-        event = ct.cast(event, ct.POINTER(portal_data)).contents
+        event = bpf_collector.portal_data.from_address(event_addr)
         process_info = self.get_process_info(pid)
-        process_info.last_portal_key = event.portal_key.as_tuple()
-        if process_info.last_portal_key in process_info.query_cache:
-            process_info.query_cache[process_info.last_portal_key].update(
-                bpf_collector.metadata, event
-            )
+        process_info.last_portal_key = Id128.tuple_from_address(
+            event_addr + bpf_collector.portal_key_offset
+        )
+        query = process_info.query_cache.get(process_info.last_portal_key)
+        if query is not None:
+            query.update(bpf_collector.metadata, event)
         return 0
 
     # pylint: disable=unused-argument
     def handle_DropPortalReturn(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle DropPortalReturn event. This event is produced by an uretprobe on
@@ -188,20 +253,19 @@ class QueryTracerEventHandler(EventHandler):
 
         We remove the query from the internal cache  and append it to history.
         """
-        event = ct.cast(event, ct.POINTER(portal_data)).contents
         process_info = self.get_process_info(pid)
         if process_info.last_portal_key is not None:
-            if process_info.last_portal_key in process_info.query_cache:
-                query = process_info.query_cache[process_info.last_portal_key]
+            query = process_info.query_cache.pop(process_info.last_portal_key, None)
+            if query is not None:
                 process_info.query_history.append(query)
-                del process_info.query_cache[process_info.last_portal_key]
+                process_info.record_query_scalars(query)
             process_info.last_portal_key = None
         process_info.current_executor = None
         process_info.current_query = None
         return 0
 
     def handle_ExecProcNodeFirst(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ExecProcNodeFirst event. This event is produced by a uprobe on
@@ -209,9 +273,11 @@ class QueryTracerEventHandler(EventHandler):
 
         The goal here is to build a plan tree for the query.
         """
-        event = ct.cast(event, ct.POINTER(planstate_data)).contents
+        event = bpf_collector.planstate_data.from_address(event_addr)
         process_info = self.get_process_info(pid)
-        query = process_info.query_cache.get(event.portal_key.as_tuple())
+        query = process_info.query_cache.get(
+            Id128.tuple_from_address(event_addr + bpf_collector.planstate_key_offset)
+        )
         if query is None:
             # We don't know this query: maybe it started running before us ?
             return 0
@@ -221,14 +287,14 @@ class QueryTracerEventHandler(EventHandler):
                 EventType.MemoryResponseNodeInstr,
                 Id128.from_int(event.planstate_addr),
                 event.planstate_addr,
-                bpf_collector.metadata.structs.PlanState,
+                bpf_collector.structs.PlanState,
                 ["instrument"],
             )
             bpf_collector.send_memory_request(pid, request)
         return 0
 
     def handle_ExecEndNode(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle ExecEndNode event. This event is produced by a uprobe on
@@ -237,7 +303,7 @@ class QueryTracerEventHandler(EventHandler):
         Once the executor node is destroyed, we want to collect it's
         instrumentation data if any.
         """
-        event = ct.cast(event, ct.POINTER(planstate_data)).contents
+        event = bpf_collector.planstate_data.from_address(event_addr)
         process_info = self.get_process_info(pid)
         if process_info.last_portal_key is None:
             return 0
@@ -248,13 +314,13 @@ class QueryTracerEventHandler(EventHandler):
         if node is None:
             return 0
         instrument_addr = ct.addressof(event.instrument)
-        instrument = bpf_collector.metadata.structs.Instrumentation(instrument_addr)
+        instrument = bpf_collector.instrument_cls(instrument_addr)
         instrument.nloops = ct.c_double(instrument.nloops.value + 1)  # type: ignore
         node.instrument = instrument
         return 0
 
     def handle_KBlockRqIssue(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle KBlockRqIssue event. This event is produced by a kernel
@@ -263,7 +329,7 @@ class QueryTracerEventHandler(EventHandler):
         This serves to keep a count of block IO performed by a device, which
         can be useful to compute "real" cache hit ratio.
         """
-        event = ct.cast(event, ct.POINTER(io_req_data)).contents
+        event = io_req_data.from_address(event_addr)
         process_info = self.get_process_info(pid)
         # We try to attach it to a specific query.
         # If we don't have one, don't bother
@@ -279,14 +345,14 @@ class QueryTracerEventHandler(EventHandler):
         return 0
 
     def handle_MemoryResponseQueryInstr(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle MemoryResponseQueryInstr
 
         We lookup the request_id, and update the given counters if needed.
         """
-        ev = ct.cast(event, ct.POINTER(memory_response)).contents
+        ev = memory_response.from_address(event_addr)
 
         process_info = self.get_process_info(pid)
         if not process_info.current_executor:
@@ -294,7 +360,7 @@ class QueryTracerEventHandler(EventHandler):
         # We have a memory response for the whole query
         query = process_info.query_cache.get(ev.request_id.as_tuple(), None)
         if query:
-            instr = bpf_collector.metadata.structs.Instrumentation(ev.payload_addr)
+            instr = bpf_collector.instrument_cls(ev.payload_addr)
             query.instrument = instr
             # Load all fields from the underlying memory.
             instr.as_dict(include_all=True)
@@ -303,7 +369,7 @@ class QueryTracerEventHandler(EventHandler):
                 EventType.MemoryResponseQueryInstr,
                 ev.request_id,
                 query.addr,
-                bpf_collector.metadata.structs.QueryDesc,
+                bpf_collector.structs.QueryDesc,
                 ["planstate", "instrument"],
             )
 
@@ -311,7 +377,7 @@ class QueryTracerEventHandler(EventHandler):
         return 0
 
     def handle_MemoryResponseNodeInstr(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle MemoryResponseNodeInstr produced as a response to some memory_request.
@@ -320,27 +386,27 @@ class QueryTracerEventHandler(EventHandler):
         if not process_info.current_executor:
             return 0
         query = process_info.query_cache.get(process_info.current_executor, None)
-        ev = ct.cast(event, ct.POINTER(memory_response)).contents
+        ev = memory_response.from_address(event_addr)
         nodeid = ev.request_id.as_int()
         # We have a memory response for an individual node
         if query is not None and nodeid is not None:
             node = query.nodes.get(nodeid)
             if node is not None:
-                instr = bpf_collector.metadata.structs.Instrumentation(ev.payload_addr)
+                instr = bpf_collector.instrument_cls(ev.payload_addr)
                 node.instrument = instr
                 # Re-send the same request for continuous monitoring
                 request = bpf_collector.build_memory_request(
                     EventType.MemoryResponseNodeInstr,
                     Id128.from_int(nodeid),
                     nodeid,
-                    bpf_collector.metadata.structs.PlanState,
+                    bpf_collector.structs.PlanState,
                     ["instrument"],
                 )
                 bpf_collector.send_memory_request(pid, request)
         return 0
 
     def handle_MemoryNodeData(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle MemoryNodeData produced as a response for a memory_request.
@@ -348,7 +414,7 @@ class QueryTracerEventHandler(EventHandler):
         process_info = self.get_process_info(pid)
         if not process_info.current_executor:
             return 0
-        ev = ct.cast(event, ct.POINTER(planstate_data)).contents
+        ev = bpf_collector.planstate_data.from_address(event_addr)
         query = process_info.query_cache.get(process_info.current_executor, None)
         if query is not None:
             node = query.add_node_from_event(bpf_collector.metadata, ev)
@@ -376,18 +442,18 @@ class QueryTracerEventHandler(EventHandler):
             EventType.MemoryNodeData,
             Id128.from_int(nodeaddr),
             nodeaddr,
-            bpf_collector.metadata.structs.PlanState,
+            bpf_collector.structs.PlanState,
             [],
         )
         bpf_collector.send_memory_request(pid, req)
 
     def handle_StackSample(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle StackSample events produced during perf sampling.
         """
-        ev = ct.cast(event, ct.POINTER(stack_sample)).contents
+        ev = bpf_collector.stack_sample.from_address(event_addr)
         process_info = self.get_process_info(pid)
         _, creation_time = ev.portal_data.portal_key.as_tuple()
         if creation_time:
@@ -405,12 +471,12 @@ class QueryTracerEventHandler(EventHandler):
         return 0
 
     def handle_MemoryAccount(
-        self, bpf_collector: BPFCollector, event: ct._CData, pid: int
+        self, bpf_collector: BPFCollector, event_addr: int, pid: int
     ) -> int:
         """
         Handle MemoryAccount events produced by malloc instrumentation.
         """
-        ev = ct.cast(event, ct.POINTER(memory_account)).contents
+        ev = memory_account.from_address(event_addr)
         process_info = self.get_process_info(pid)
         if process_info.current_query:
             process_info.current_query.memallocs.update(ev)
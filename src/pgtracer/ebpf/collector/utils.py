@@ -10,15 +10,10 @@ def intenum_to_c(intenum: Type[IntEnum]) -> str:
     """
     Generate C code defining an enum corresponding to a Python IntEnum.
     """
-    buf = f"enum {intenum.__name__} {{\n"
-    members = []
-
-    for member in intenum:
-        members.append(f"{intenum.__name__}{member.name} = {member.value}")
-    buf += ",\n".join(members)
-    buf += "\n};\n"
-
-    return buf
+    members = ",\n".join(
+        f"{intenum.__name__}{member.name} = {member.value}" for member in intenum
+    )
+    return f"enum {intenum.__name__} {{\n{members}\n}};\n"
 
 
 def defines_dict_to_c(defines_dict: Dict[str, Any]) -> str:
@@ -12,6 +12,7 @@ from __future__ import annotations
 
 import ctypes as ct
 import json
+import os
 import struct
 from bisect import bisect_right
 from collections import defaultdict
@@ -47,7 +48,6 @@ from elftools.dwarf.locationlists import LocationParser
 from elftools.dwarf.ranges import BaseAddressEntry, RangeEntry
 from elftools.elf.elffile import ELFFile
 from elftools.elf.sections import Section
-from pypsutil import Process
 
 from .eh_frame_hdr import EhFrameHdr
 
@@ -96,35 +96,44 @@ class MappedRegion:
         self.end = max(self.end, region.end)
 
 
-def get_mapped_regions(process: Process, root: Path) -> List[MappedRegion]:
+def get_mapped_regions(pid: int, root: Path) -> List[MappedRegion]:
     """
     Returns a list, sorted in the start region order.
+
+    The regions are parsed directly from /proc/<pid>/maps: we only need
+    the addresses, offset and backing path of each map.
     """
     mapped_regions: Dict[str, MappedRegion] = {}
-    for mmap in process.memory_maps():
-        start = mmap.addr_start
-        end = mmap.addr_end
-        # Update it
-        mapped_region = mapped_regions.get(mmap.path)
-        if mapped_region is None:
-            real_path = None
-            if mmap.path.startswith("/"):
-                real_path = root / Path(mmap.path).relative_to("/")
-                if not real_path.exists():
-                    real_path = None
-            mapped_region = MappedRegion(
-                mmap.path, start, end, real_path=real_path, offset=mmap.offset
+    with open(f"/proc/{pid}/maps", encoding="utf8") as mapsfile:
+        for line in mapsfile:
+            # Format: address perms offset dev inode [pathname]
+            parts = line.split(maxsplit=5)
+            start_str, _, end_str = parts[0].partition("-")
+            start = int(start_str, 16)
+            end = int(end_str, 16)
+            offset = int(parts[2], 16)
+            path = parts[5].rstrip("\n") if len(parts) > 5 else ""
+            # Update it
+            mapped_region = mapped_regions.get(path)
+            if mapped_region is None:
+                real_path = None
+                if path.startswith("/"):
+                    real_path = root / Path(path).relative_to("/")
+                    if not real_path.exists():
+                        real_path = None
+                mapped_region = MappedRegion(
+                    path, start, end, real_path=real_path, offset=offset
+                )
+                mapped_regions[path] = mapped_region
+                continue
+            new_mapped_region = MappedRegion(
+                path,
+                start,
+                end,
+                offset=offset,
+                real_path=mapped_region.real_path,
             )
-            mapped_regions[mmap.path] = mapped_region
-            continue
-        new_mapped_region = MappedRegion(
-            mmap.path,
-            start,
-            end,
-            offset=mmap.offset,
-            real_path=mapped_region.real_path,
-        )
-        mapped_region.update(new_mapped_region)
+            mapped_region.update(new_mapped_region)
     return sorted(mapped_regions.values(), key=attrgetter("start"))
 
 
@@ -710,11 +719,19 @@ class ProcessMetadata:
     from memory maps) with DWARF information.
     """
 
-    def __init__(self, process: Process, cache_dir: Optional[Path] = None):
+    def __init__(
+        self,
+        pid: int,
+        cache_dir: Optional[Path] = None,
+        program: Optional[Union[str, Path]] = None,
+    ):
         self.cache_dir = cache_dir
-        self.pid = process.pid
-        self.root = Path(f"/proc/{process.pid}/root")
-        self.program_raw = Path(process.exe())
+        self.pid = pid
+        self.root = Path(f"/proc/{pid}/root")
+        if program is None:
+            # A single readlink is all we need to resolve the executable.
+            program = os.readlink(f"/proc/{pid}/exe")
+        self.program_raw = Path(program)
         elffile = ELFFile.load_from_path(bytes(self.program))
         self.buildid = extract_buildid(elffile)
         elffile = find_debuginfo(elffile, root=self.root, buildid=self.buildid)
@@ -722,7 +739,7 @@ class ProcessMetadata:
             raise SystemError(f"Couldn't find debug info for {self.program}")
         self.elffile = elffile
         self.dwarf_info = self.elffile.get_dwarf_info()
-        self.maps = get_mapped_regions(process, get_actual_root(process.pid))
+        self.maps = get_mapped_regions(pid, get_actual_root(pid))
         gdb_index_section = self.elffile.get_section_by_name(".gdb_index")
         self.gdb_index: Optional[GDBIndex] = None
         self.naive_index: Dict[str, Dict[str, Set[Tuple[int, int]]]] = defaultdict(
@@ -8,6 +8,7 @@ import ctypes as ct
 import ctypes.util
 import platform
 import re
+import sys
 from functools import cached_property
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Generator, List, Optional, Tuple, Type, TypeVar
@@ -417,11 +418,17 @@ class Frame:
     @cached_property
     def function_name(self) -> Optional[str]:
         """
-        Returns the function name associated to this frame's DIE
+        Returns the function name associated to this frame's DIE.
+
+        The name is interned: consumers filtering frames against a set of
+        function names then get a pointer-equality fast path.
         """
         if self.die is None:
             return None
-        return die_name(self.die)
+        name = die_name(self.die)
+        if name is None:
+            return None
+        return sys.intern(name)
 
     def _get_parsed_expr_for_attribute(self, argnum: int) -> List[DWARFExprOp]:
         """
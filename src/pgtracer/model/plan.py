@@ -26,6 +26,18 @@ class PlanState:
     Information collected from a PostgreSQL PlanState Node.
     """
 
+    # A plan tree can hold thousands of those: __slots__ shrinks each
+    # instance and speeds up attribute access on the event path.
+    __slots__ = (
+        "addr",
+        "tag",
+        "instrument",
+        "parent_node",
+        "plan_data",
+        "is_stub",
+        "children",
+    )
+
     def __init__(self, addr: Optional[int]):
         self.addr = addr
         self.tag: Optional[IntEnum] = None
@@ -6,9 +6,10 @@ from __future__ import annotations
 import ctypes as ct
 from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING, Any, Dict, Optional
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
 
-from ..ebpf.unwind import UnwindAddressSpace, stack_data_t
+from ..ebpf.unwind import Frame, UnwindAddressSpace, stack_data_t
 from ..utils import timespec_to_timedelta
 from .memory import MemoryAllocations
 from .plan import PlanState
@@ -70,12 +71,37 @@ FUNCTION_ARGS_MAPPING = {
     "MultiExecBitmapOr": 1,
 }
 
+# All the functions above take the PlanState as their first argument: keep a
+# frozenset for the membership test performed on every stack frame.
+EXEC_NODE_FUNCTIONS = frozenset(FUNCTION_ARGS_MAPPING)
+
 
 class Query:
     """
     A PostgreSQL Query.
     """
 
+    # Collectors keep a sizable history of those: __slots__ avoids paying
+    # for a per-instance __dict__.
+    __slots__ = (
+        "addr",
+        "query_id",
+        "startup_cost",
+        "total_cost",
+        "plan_rows",
+        "startts",
+        "text",
+        "instrument",
+        "search_path",
+        "nodes",
+        "io_counters",
+        "memallocs",
+        "_root_node",
+        "_instrument_cls",
+        "_query_bytes",
+        "_search_path_bytes",
+    )
+
     def __init__(
         self,
         *,
@@ -102,12 +128,26 @@ class Query:
         self.nodes: Dict[int, PlanState] = {}
         self.io_counters: Dict[str, int] = defaultdict(lambda: 0)
         self.memallocs: MemoryAllocations = MemoryAllocations()
+        # Cached root node, invalidated whenever the plan tree is mutated:
+        # computing it scans every node, which is too expensive to do on
+        # each access for frequently refreshed displays.
+        self._root_node: Optional[PlanState] = None
+        # The Instrumentation class is built dynamically from the DWARF
+        # information: cache it here instead of resolving it through
+        # metadata.structs on every event.
+        self._instrument_cls: Any = None
+        # Raw bytes for the query text and search_path, kept to skip
+        # decoding buffers which did not change between two events.
+        self._query_bytes: bytes = b""
+        self._search_path_bytes: bytes = b""
 
     @property
     def root_node(self) -> PlanState:
         """
         Returns the plan's root node.
         """
+        if self._root_node is not None:
+            return self._root_node
         root_candidates = [
             node for node in self.nodes.values() if node.parent_node is None
         ]
@@ -119,6 +159,7 @@ class Query:
             root_node.children = {c: None for c in root_candidates}
         else:
             root_node = root_candidates[0]
+        self._root_node = root_node
         return root_node
 
     @classmethod
@@ -126,37 +167,65 @@ class Query:
         """
         Build a query from portal_data event generated by eBPF.
         """
+        instrument_cls = metadata.structs.Instrumentation
         instrument_addr = ct.addressof(event.instrument)
-        instrument = metadata.structs.Instrumentation(instrument_addr)
+        instrument = instrument_cls(instrument_addr)
+        # The lengths are written by the eBPF code: reading exactly that
+        # many bytes avoids scanning the whole buffers for a terminator.
+        event_cls = type(event)
+        base_addr = ct.addressof(event)
+        raw_search_path = ct.string_at(
+            base_addr + event_cls.search_path.offset, event.search_path_len
+        )
         search_path = None
-        if event.search_path:
-            search_path = event.search_path.decode("utf8")
+        if raw_search_path:
+            search_path = raw_search_path.decode("utf8")
+        raw_query = ct.string_at(base_addr + event_cls.query.offset, event.query_len)
         _, creation_time = event.portal_key.as_tuple()
-        return cls(
+        query = cls(
             addr=event.query_addr,
             query_id=event.query_id,
             startup_cost=event.startup_cost,
             total_cost=event.total_cost,
             plan_rows=event.plan_rows,
             startts=creation_time,
-            text=event.query.decode("utf8"),
+            text=raw_query.decode("utf8"),
             instrument=instrument,
             search_path=search_path,
         )
+        query._instrument_cls = instrument_cls
+        query._query_bytes = raw_query
+        query._search_path_bytes = raw_search_path
+        return query
 
     def update(self, metadata: ProcessMetadata, event: portal_data) -> None:
         """
         Update the query from an eBPF portal_data event.
         """
+        instrument_cls = self._instrument_cls
+        if instrument_cls is None:
+            instrument_cls = self._instrument_cls = metadata.structs.Instrumentation
         instrument_addr = ct.addressof(event.instrument)
-        instrument = metadata.structs.Instrumentation(instrument_addr)
+        instrument = instrument_cls(instrument_addr)
         if instrument.running:
             self.instrument = instrument
         _, creation_time = event.portal_key.as_tuple()
         self.startts = creation_time or self.startts
-        self.text = event.query.decode("utf-8") or self.text
-        search_path = event.search_path.decode("utf8")
-        self.search_path = search_path or self.search_path
+        # The query text and search_path rarely change between two events
+        # about the same portal: only pay for the decoding when the raw
+        # bytes differ from what we already have.
+        event_cls = type(event)
+        base_addr = ct.addressof(event)
+        raw_query = ct.string_at(base_addr + event_cls.query.offset, event.query_len)
+        if raw_query and raw_query != self._query_bytes:
+            self._query_bytes = raw_query
+            self.text = raw_query.decode("utf-8")
+        raw_search_path = ct.string_at(
+            base_addr + event_cls.search_path.offset, event.search_path_len
+        )
+        if raw_search_path and raw_search_path != self._search_path_bytes:
+            self._search_path_bytes = raw_search_path
+            self.search_path = raw_search_path.decode("utf8")
 
     @property
     def start_datetime(self) -> Optional[datetime]:
@@ -221,23 +290,29 @@ class Query:
     ) -> None:
         """
         Process a capture stack to add node stubs to this query.
+
+        This is the hottest per-node loop: everything it touches repeatedly
+        is hoisted into locals and the skipped frames are dropped with
+        islice rather than a counter check per iteration.
         """
+        self._root_node = None
         addr_space = UnwindAddressSpace(stack, metadata)
         nodes = self.nodes
         cur_node = base_node
-        for idx, frame in enumerate(addr_space.frames()):
-            if idx < start_at:
-                continue
-            if frame.function_name in FUNCTION_ARGS_MAPPING:
-                argnum = FUNCTION_ARGS_MAPPING[frame.function_name]
-                parent_addr = frame.fetch_arg(argnum, ct.c_ulonglong).value
-                if cur_node and parent_addr == cur_node.addr:
+        exec_node_functions = EXEC_NODE_FUNCTIONS
+        c_ulonglong = ct.c_ulonglong
+        frames: Iterator[Frame] = addr_space.frames()
+        if start_at:
+            frames = islice(frames, start_at, None)
+        for frame in frames:
+            if frame.function_name in exec_node_functions:
+                parent_addr = frame.fetch_arg(1, c_ulonglong).value
+                if cur_node is not None and parent_addr == cur_node.addr:
                     continue
                 parent_node = nodes.get(parent_addr)
                 if parent_node is None:
-                    parent_node = PlanState(parent_addr)
-                    nodes[parent_addr] = parent_node
-                if cur_node:
+                    parent_node = nodes[parent_addr] = PlanState(parent_addr)
+                if cur_node is not None:
                     cur_node.parent_node = parent_node
                     parent_node.children[cur_node] = None
                 # The parent_node is already not a stub, meaning its ancestors
@@ -254,6 +329,7 @@ class Query:
         We walk the stack up to understand where the nodes are located relative
         to each other.
         """
+        self._root_node = None
         nodes = self.nodes
         addr = event.planstate_addr
         planstate = nodes.get(addr)
@@ -181,7 +181,7 @@ def main() -> None:
                 for query in process_info.query_history:
                     print_query(query, options)
                 total_queries += len(process_info.query_history)
-                process_info.query_history = []
+                process_info.query_history.clear()
         except KeyboardInterrupt:
             break
     collector.stop()
@@ -4,12 +4,11 @@ Miscellaneous utility functions.
 
 import functools
 import itertools
+import os
 import re
 import subprocess
 from datetime import timedelta
-from typing import TYPE_CHECKING, BinaryIO, Optional, Union
-
-from pypsutil import Process
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional, Union
 
 from pgtracer.ebpf.dwarf import Struct
 
@@ -45,6 +44,46 @@ def timespec_to_float(timespec: _CData) -> float:
     raise ValueError("Expecting a timespec or instr_time struct")
 
 
+def get_process_name(pid: int) -> str:
+    """
+    Returns the name (comm) of the given process.
+    """
+    with open(f"/proc/{pid}/comm", encoding="utf8") as commfile:
+        return commfile.read().strip()
+
+
+def get_parent_pid(pid: int) -> int:
+    """
+    Returns the parent pid of the given process.
+    """
+    with open(f"/proc/{pid}/stat", "rb") as statfile:
+        data = statfile.read()
+    # The comm field may contain spaces and parentheses: the numeric fields
+    # start after the last closing parenthesis.
+    return int(data.rsplit(b")", 1)[1].split()[1])
+
+
+def iter_descendant_pids(pid: int) -> Iterator[int]:
+    """
+    Iterate over all the descendants of the given process.
+    """
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        child_pid = int(entry)
+        try:
+            children.setdefault(get_parent_pid(child_pid), []).append(child_pid)
+        except OSError:
+            # The process vanished while we were iterating.
+            continue
+    queue = [pid]
+    while queue:
+        for child_pid in children.get(queue.pop(), []):
+            yield child_pid
+            queue.append(child_pid)
+
+
 NSPID_PARSING_RE = re.compile(rb"^NSpid:\s+((?:(?:\d+)\s*)+)")
 
 
@@ -61,9 +100,8 @@ def resolve_container_pid(container: str, container_pid: int) -> Optional[int]:
     )
     container_leader_pid = int(completed_process.stdout.split(b"=")[1])
     # Now iterate over all child processes from this container.
-    leader_process = Process(container_leader_pid)
-    for child in leader_process.children(recursive=True):
-        with open(f"/proc/{child.pid}/status", "rb") as statf:
+    for child_pid in iter_descendant_pids(container_leader_pid):
+        with open(f"/proc/{child_pid}/status", "rb") as statf:
             for line in statf:
                 nspid_match = NSPID_PARSING_RE.match(line)
                 if nspid_match:
@@ -20,37 +20,17 @@ TEST_BINARY = Path(__file__).parent / "test_bins" / "test.elf"
 TEST_EXEC_BINARY = Path(__file__).parent / "test_bins" / "test_stack.main"
 
 
-class MockProcess:
-    """
-    Mock a pypsutil.Process.
-    """
-
-    def __init__(self, binary):
-        self.binary = binary
-
-    def exe(self):
-        """
-        Returns a constant binary string.
-        """
-        return self.binary
-
-    @property
-    def pid(self):
-        """
-        Returns self pid. We only need an existing pid...
-        """
-        return os.getpid()
-
-
 class TestProcessMetadata(TestCase):
     """
     Test the dwarf helpers in ProcessMetadata.
     """
 
-    @patch("pgtracer.ebpf.dwarf.get_mapped_regions", lambda process, root: [])
+    @patch("pgtracer.ebpf.dwarf.get_mapped_regions", lambda pid, root: [])
     def setUp(self):
-        self.process_meta = ProcessMetadata(MockProcess(TEST_BINARY))
-        self.exec_process_meta = ProcessMetadata(MockProcess(TEST_EXEC_BINARY))
+        # We only need an existing pid: the program is overridden with our
+        # test binaries.
+        self.process_meta = ProcessMetadata(os.getpid(), program=TEST_BINARY)
+        self.exec_process_meta = ProcessMetadata(os.getpid(), program=TEST_EXEC_BINARY)
 
     def test_struct(self):
         """
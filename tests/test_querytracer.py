@@ -14,6 +14,7 @@ from flaky import flaky
 
 from pgtracer.ebpf.collector.querytracer import (
     InstrumentationFlags,
+    PerProcessInfo,
     QueryTracerEventHandler,
 )
 from pgtracer.utils import timespec_to_timedelta as tstimedelta
@@ -281,3 +282,37 @@ def test_query_discovery(querytracer_factory, connection):
                 collector.stop()
     assert events["handle_StackSample"] > 0
     assert events["handle_MemoryNodeData"] > 0
+
+
+def test_history_stats():
+    """
+    Test the aggregates computed over the recorded query runtimes.
+    """
+    process_info = PerProcessInfo(pid=1234)
+    assert process_info.history_stats() == {
+        "count": 0,
+        "total_runtime_ns": 0.0,
+        "mean_runtime_ns": 0.0,
+        "p99_runtime_ns": 0.0,
+    }
+    process_info.runtime_history.extend(range(1, 101))
+    stats = process_info.history_stats()
+    assert stats["count"] == 100
+    assert stats["total_runtime_ns"] == 5050.0
+    assert stats["mean_runtime_ns"] == 50.5
+    # The percentile estimators differ slightly between the two backends.
+    assert 99.0 <= stats["p99_runtime_ns"] <= 100.0
+
+
+def test_history_stats_without_numpy():
+    """
+    Test that the pure-Python fallback yields the same aggregates.
+    """
+    process_info = PerProcessInfo(pid=1234)
+    process_info.runtime_history.extend(range(1, 101))
+    with patch("pgtracer.ebpf.collector.querytracer.np", None):
+        stats = process_info.history_stats()
+    assert stats["count"] == 100
+    assert stats["total_runtime_ns"] == 5050.0
+    assert stats["mean_runtime_ns"] == 50.5
+    assert stats["p99_runtime_ns"] == 100.0
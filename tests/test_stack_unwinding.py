@@ -8,7 +8,6 @@ from unittest import TestCase
 
 from bcc import BPF
 from bcc.libbcc import lib as libbcc
-from pypsutil import Process
 
 from pgtracer.ebpf.collector import CODE_BASE_PATH
 from pgtracer.ebpf.dwarf import ProcessMetadata, die_name
@@ -61,7 +60,7 @@ class TestStackUnwinding(TestCase):
         # Run the program.
         program = subprocess.Popen([binpath], stdin=subprocess.PIPE)
         # Now get the stack base address for the program.
-        pm = ProcessMetadata(Process(program.pid))
+        pm = ProcessMetadata(program.pid)
         bpf_prog = f"#define STACK_TOP_ADDR {pm.stack_top}\n"
         bpf_prog += f"#define MAX_STACK_READ {MAX_STACK_READ}\n"
         bpf_prog += TEST_EBPF_PROGRAM